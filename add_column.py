@@ -14,5 +14,14 @@ try:
     print("total_score 列添加成功")
 except sqlite3.OperationalError as e:
     print(f"添加列时出错: {e}")
+
+try:
+    # import_date 以定宽的 'YYYY/MM/DD' 文本存储，字典序与日期顺序一致，
+    # 建立索引后按导入日期清理过期数据可走索引范围扫描
+    cursor.execute("CREATE INDEX IF NOT EXISTS idx_assess_import_date ON assessments (import_date)")
+    conn.commit()
+    print("import_date 索引创建成功")
+except sqlite3.OperationalError as e:
+    print(f"创建索引时出错: {e}")
 finally:
     conn.close()
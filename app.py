@@ -1,15 +1,33 @@
 import os
+import charset_normalizer
+import numpy as np
 import pandas as pd
 import streamlit as st
 import plotly.graph_objects as go
 import sqlite3
 from io import BytesIO
 from datetime import datetime, timedelta
-import shutil
+import threading
 import streamlit_authenticator as stauth
+import xlsxwriter
 import yaml
 from yaml.loader import SafeLoader
 
+try:
+    from numba import njit
+except ImportError:  # numba 为可选依赖，未安装时排名计算直接使用 NumPy
+    njit = None
+
+try:
+    import pyarrow  # noqa: F401
+except ImportError:  # pyarrow 为可选依赖，未安装时 CSV 使用 pandas 默认的 C 解析器
+    pyarrow = None
+
+try:
+    import python_calamine  # noqa: F401
+except ImportError:  # python-calamine 为可选依赖，未安装时 Excel 使用 openpyxl/xlrd 读取
+    python_calamine = None
+
 # 确保数据库目录存在
 db_dir = "data"
 os.makedirs(db_dir, exist_ok=True)
@@ -38,17 +56,61 @@ if authentication_status:
     authenticator.logout('退出登录', 'main')
     st.write(f'欢迎 *{name}*')
 
+    @st.cache_resource
+    def get_shared_connection():
+        """创建全局共享的数据库连接和写锁，在所有会话和重新运行之间复用"""
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        # 确保中文显示正常
+        conn.text_factory = str
+        # 调整 SQLite 性能参数：WAL 日志、降低 fsync 频率、扩大页缓存
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        lock = threading.Lock()
+        # 每个进程首次建立连接时自动建表并迁移旧库结构，不依赖手动初始化
+        with lock, conn:
+            migrate_database(conn)
+        return conn, lock
+
     def get_db_connection():
         """获取数据库连接，添加异常处理"""
         try:
-            conn = sqlite3.connect(db_path)
-            # 确保中文显示正常
-            conn.text_factory = str
+            conn, _ = get_shared_connection()
             return conn
         except Exception as e:
             st.error(f"无法连接到数据库: {e}")
             return None
 
+    def get_db_write_lock():
+        """获取数据库写锁，串行化共享连接上的写事务"""
+        _, lock = get_shared_connection()
+        return lock
+
+    @st.cache_resource
+    def get_read_connection():
+        """创建全局共享的查询连接和读锁，与写连接分离"""
+        # WAL 模式下独立的读连接只看到已提交的数据，不会读到其他会话导入事务中尚未提交（可能回滚）的行
+        # 确保数据库已创建并完成结构迁移
+        get_shared_connection()
+        conn = sqlite3.connect(db_path, check_same_thread=False)
+        conn.text_factory = str
+        conn.execute("PRAGMA query_only=ON")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute("PRAGMA cache_size=-64000")
+        conn.execute("PRAGMA mmap_size=268435456")
+        return conn, threading.Lock()
+
+    def read_sql_df(sql, params=(), chunksize=None):
+        """在共享查询连接上执行 SQL 并读入 DataFrame，持有读锁串行化同一连接上的查询"""
+        conn, lock = get_read_connection()
+        with lock:
+            if chunksize is None:
+                return pd.read_sql_query(sql, conn, params=params)
+            # 分块读取后合并，降低单次取数的内存峰值
+            return pd.concat(pd.read_sql_query(sql, conn, params=params, chunksize=chunksize), ignore_index=True)
+
     def validate_score(score):
         """验证分数是否有效"""
         try:
@@ -57,6 +119,18 @@ if authentication_status:
         except (ValueError, TypeError):
             return False
 
+    def validate_scores_vec(arr):
+        """对整个分数矩阵做一次向量化比较，全部在 0~100 之间（空值不视为无效）时返回 True"""
+        return bool((((arr >= 0) & (arr <= 100)) | np.isnan(arr)).all())
+
+    def validate_scores_df(df, cols):
+        """批量验证分数列，返回无效单元格（非数值或不在 0~100 之间）的布尔矩阵，空值不视为无效"""
+        numeric = df[cols].apply(pd.to_numeric, errors='coerce')
+        arr = np.ascontiguousarray(numeric.to_numpy(dtype=np.float64))
+        out_of_range = ~((arr >= 0) & (arr <= 100)) & ~np.isnan(arr)
+        not_numeric = np.isnan(arr) & df[cols].notna().to_numpy()
+        return out_of_range | not_numeric
+
     def update_assessment(assessment_id, scores):
         """更新评估数据"""
         conn = get_db_connection()
@@ -64,44 +138,47 @@ if authentication_status:
             return False
         
         try:
-            cursor = conn.cursor()
-            # 构建SQL更新语句
-            set_clauses = ", ".join([f"{dim_to_db_col[dim]} = ?" for dim in DIMENSIONS])
-            values = [scores[dim] for dim in DIMENSIONS] + [assessment_id]
+            with get_db_write_lock(), conn:
+                cursor = conn.cursor()
+                # 构建SQL更新语句，同时更新综合得分
+                set_clauses = ", ".join([f"{db_col} = ?" for db_col in DB_COLS_ORDERED] + ["total_score = ?"])
+                total_score = calculate_total_score(scores)
+                values = [scores[dim] for dim in DIMENSIONS] + [total_score, assessment_id]
             
-            sql = f"UPDATE assessments SET {set_clauses} WHERE id = ?"
-            cursor.execute(sql, values)
-            conn.commit()
+                sql = f"UPDATE assessments SET {set_clauses} WHERE id = ?"
+                cursor.execute(sql, values)
+            bump_data_version()
             return True
         except Exception as e:
             st.error(f"更新评估数据失败: {e}")
-            conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
+
+    def score_matrix(df):
+        """按 DB_COLS_ORDERED 取出行优先（C 连续）的分数矩阵，空值按0处理"""
+        # pandas 由同类型列块转换得到的数组通常是列优先（F 连续）的，与权重向量相乘前转为按行连续
+        return np.ascontiguousarray(df[list(DB_COLS_ORDERED)].fillna(0).to_numpy(dtype=np.float64))
+
+    @st.cache_data(ttl=60, show_spinner=False)
+    def query_leader_assessments(leader_id, db_version):
+        """查询网格长评估数据（按日期倒序的 DataFrame），结果按网格长和数据库版本缓存"""
+        # 直接读入 DataFrame，按列构建，不经过逐行字典
+        return read_sql_df(
+            f"SELECT id, date, {', '.join(db_columns)}, total_score "
+            "FROM assessments WHERE leader_id = ? ORDER BY date DESC",
+            params=(leader_id,)
+        )
 
     def get_leader_assessments(leader_id):
         """获取网格长评估数据"""
-        conn = get_db_connection()
-        if conn is None:
-            return []
+        empty = pd.DataFrame(columns=["id", "date"] + db_columns + ["total_score"])
+        if get_db_connection() is None:
+            return empty
         
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                "SELECT * FROM assessments WHERE leader_id = ? ORDER BY date DESC",
-                (leader_id,)
-            )
-            columns = [col[0] for col in cursor.description]
-            # 确保将查询结果转换为字典，避免使用元组索引
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return query_leader_assessments(leader_id, get_db_version())
         except Exception as e:
             st.error(f"获取评估数据失败: {e}")
-            return []
-        finally:
-            if conn:
-                conn.close()
+            return empty
 
     def handle_none_scores(scores, dimensions):
         """处理分数中的None值，确保所有维度都有值"""
@@ -110,62 +187,114 @@ if authentication_status:
                 scores[dim] = 0
         return scores
 
-    def calculate_total_score(scores, weights, dimensions):
-        """计算综合得分"""
-        total = 0
-        for dim in dimensions:
-            total += scores.get(dim, 0) * weights[dim]
-        return total
+    def calculate_total_score(scores):
+        """计算综合得分：按 DIMENSIONS 顺序取出分数向量，与权重向量做一次点积"""
+        score_vec = np.fromiter((scores.get(dim, 0) for dim in DIMENSIONS), dtype=np.float64, count=len(DIMENSIONS))
+        return float(compute_total_scores(score_vec))
 
-    def get_all_leaders(refresh=False):
-        """获取所有网格长，支持强制刷新缓存"""
-        conn = get_db_connection()
-        if conn is None:
+    def get_db_version():
+        """查询缓存的版本号：数据库文件（含 WAL 日志）的修改时间加上本会话的写入计数"""
+        paths = [db_path, db_path + "-wal"]
+        mtime = max((os.path.getmtime(path) for path in paths if os.path.exists(path)), default=0)
+        return mtime, st.session_state.get("data_version", 0)
+
+    def bump_data_version():
+        """写入数据后递增本会话的数据版本号，只让依赖数据的查询缓存失效"""
+        st.session_state.data_version = st.session_state.get("data_version", 0) + 1
+
+    @st.cache_data(ttl=60, show_spinner=False)
+    def query_all_leaders(db_version):
+        """查询所有网格长，结果按数据库版本缓存"""
+        # 直接读入 DataFrame 后整体转换为记录列表，不在 Python 中逐行拼装字典
+        return read_sql_df("SELECT id, name, area FROM grid_leaders").to_dict('records')
+
+    def get_all_leaders():
+        """获取所有网格长，数据未变化时直接使用缓存"""
+        if get_db_connection() is None:
             return []
         
         try:
-            cursor = conn.cursor()
-            cursor.execute("SELECT * FROM grid_leaders")
-            columns = [col[0] for col in cursor.description]
-            leaders = [dict(zip(columns, row)) for row in cursor.fetchall()]
-            
-            # 强制刷新时更新缓存
-            if refresh:
-                st.session_state.all_leaders = leaders
-            return leaders
+            return query_all_leaders(get_db_version())
         except Exception as e:
             st.error(f"获取网格长列表失败: {e}")
             return []
-        finally:
-            if conn:
-                conn.close()
-
-    # 能力维度配置
-    DIMENSIONS = [
-        "专业技术能力", "指标掌控能力", "管理执行能力", "沟通协调能力", "市场营销能力",
-        "超长工单占比", "催单率", "上门及时率", "重复投诉率", "万投比",
-        "触点服务客户满意占比", "质差客户占比", "家宽单用户中断时长", "家宽弱光率",
-        "任务工单支撑及时率", "交班交底率", "终端盘点", "人员达标率",
-        "低销占比", "商机转化率", "元宝完成率", "终端收入"
-    ]
-    
-    # 定义数据库字段映射
-    db_columns = [
-        "professional_skill", "index_mastery", "management_execution", "communication_coordination", "marketing_ability",
-        "long_work_order_ratio", "reminder_rate", "on_site_timeliness", "repeat_complaint_rate", "complaints_per_ten_thousand",
-        "contact_service_satisfaction", "poor_quality_customer_ratio", "home_broadband_interrupt_duration", "home_broadband_weak_light_rate",
-        "task_support_timeliness", "handover_rate", "terminal_inventory", "personnel_qualified_rate",
-        "low_sales_ratio", "business_opportunity_conversion_rate", "yuanbao_completion_rate", "terminal_revenue"
-    ]
-    
-    # 创建维度到数据库列的映射
-    dim_to_db_col = {dim: db_col for dim, db_col in zip(DIMENSIONS, db_columns)}
+
+    # 能力维度配置：(维度名称, 数据库列名) 按固定顺序定义一次，其余映射均由此派生，避免各处重复维护
+    DIM_COLS = (
+        ("专业技术能力", "professional_skill"),
+        ("指标掌控能力", "index_mastery"),
+        ("管理执行能力", "management_execution"),
+        ("沟通协调能力", "communication_coordination"),
+        ("市场营销能力", "marketing_ability"),
+        ("超长工单占比", "long_work_order_ratio"),
+        ("催单率", "reminder_rate"),
+        ("上门及时率", "on_site_timeliness"),
+        ("重复投诉率", "repeat_complaint_rate"),
+        ("万投比", "complaints_per_ten_thousand"),
+        ("触点服务客户满意占比", "contact_service_satisfaction"),
+        ("质差客户占比", "poor_quality_customer_ratio"),
+        ("家宽单用户中断时长", "home_broadband_interrupt_duration"),
+        ("家宽弱光率", "home_broadband_weak_light_rate"),
+        ("任务工单支撑及时率", "task_support_timeliness"),
+        ("交班交底率", "handover_rate"),
+        ("终端盘点", "terminal_inventory"),
+        ("人员达标率", "personnel_qualified_rate"),
+        ("低销占比", "low_sales_ratio"),
+        ("商机转化率", "business_opportunity_conversion_rate"),
+        ("元宝完成率", "yuanbao_completion_rate"),
+        ("终端收入", "terminal_revenue"),
+    )
+    DIMENSIONS = [dim for dim, _ in DIM_COLS]
+    db_columns = [db_col for _, db_col in DIM_COLS]
+    # 按 DIMENSIONS 顺序固定的数据库列名，热点循环和批量矩阵运算中直接使用
+    DB_COLS_ORDERED = tuple(db_columns)
     WEIGHTS = {dim: 1/len(DIMENSIONS) for dim in DIMENSIONS}
+    # 按 DIMENSIONS 顺序排列的权重向量，用于矩阵方式批量计算综合得分
+    WEIGHTS_ARR = np.array([WEIGHTS[dim] for dim in DIMENSIONS], dtype=np.float64)
+    assert abs(WEIGHTS_ARR.sum() - 1.0) < 1e-6, "各维度权重之和必须为 1"
+    # 综合得分统一舍入到固定精度再保存、评级和排名：浮点求和顺序不同会产生末位误差，
+    # 舍入后相同的分数总能得到相同的综合得分
+    TOTAL_SCORE_DECIMALS = 6
+    # 综合得分的 SQL 表达式，权重按 DIMENSIONS 顺序以参数绑定（WEIGHTS_ARR.tolist()），空分数按0处理
+    TOTAL_SCORE_SQL = (
+        "ROUND(" + " + ".join([f"COALESCE({db_col}, 0) * ?" for db_col in DB_COLS_ORDERED])
+        + f", {TOTAL_SCORE_DECIMALS})"
+    )
+
+    def compute_total_scores(scores):
+        """按 DIMENSIONS 顺序的分数向量或矩阵（每行一条评估）计算综合得分，并舍入到固定精度"""
+        return np.round(scores @ WEIGHTS_ARR, TOTAL_SCORE_DECIMALS)
     THRESHOLDS = {
         "优秀": 85,
         "良好": 75,
         "合格": 60
     }
+    # 等级编码与 rank_and_grade 返回的 grade 代码一一对应
+    GRADE_LABELS = np.array(["优秀", "良好", "合格", "待改进"])
+    # 等级分界值（升序），bucketize 与 rank_and_grade 都只按它二分查找分档
+    GRADE_BOUNDS = np.array([THRESHOLDS["合格"], THRESHOLDS["良好"], THRESHOLDS["优秀"]], dtype=np.float64)
+
+    def bucketize(scores):
+        """将分数（标量或数组）批量映射为等级代码，0=优秀 … 3=待改进，与 GRADE_LABELS 对应"""
+        return len(GRADE_BOUNDS) - np.searchsorted(GRADE_BOUNDS, scores, side='right')
+
+    def rank_and_grade(totals, grade_bounds):
+        """按综合得分计算排名（1 开始）和等级代码，可由 numba 编译；分档方式与 bucketize 相同"""
+        n = totals.shape[0]
+        order = np.argsort(-totals, kind='mergesort')
+        ranks = np.empty(n, dtype=np.int32)
+        ranks[order] = np.arange(1, n + 1).astype(np.int32)
+        grades = len(grade_bounds) - np.searchsorted(grade_bounds, totals, side='right')
+        return ranks, grades
+
+    @st.cache_resource
+    def get_rank_kernel():
+        """返回排名函数：安装了 numba 时编译并预热一次，之后在各次重新运行间复用"""
+        if njit is None:
+            return rank_and_grade
+        kernel = njit(cache=True)(rank_and_grade)
+        kernel(np.zeros(1, dtype=np.float64), GRADE_BOUNDS)
+        return kernel
     
     IMPROVEMENT_TIPS = {
         "专业技术能力": ["加强专业技能培训", "参与技术交流活动", "考取相关专业证书"],
@@ -192,6 +321,91 @@ if authentication_status:
         "终端收入": ["优化产品结构", "提高销售能力", "加强客户关系管理"]
     }
     
+    def migrate_database(conn):
+        """建表并兼容旧库结构：合并重复网格长、补建索引、补充并回填 total_score 列（需在写事务内调用）"""
+        cursor = conn.cursor()
+
+        # 创建网格长表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS grid_leaders (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            area TEXT NOT NULL
+        )
+        ''')
+
+        # 创建评估表
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS assessments (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            leader_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            professional_skill REAL,
+            index_mastery REAL,
+            management_execution REAL,
+            communication_coordination REAL,
+            marketing_ability REAL,
+            long_work_order_ratio REAL,
+            reminder_rate REAL,
+            on_site_timeliness REAL,
+            repeat_complaint_rate REAL,
+            complaints_per_ten_thousand REAL,
+            contact_service_satisfaction REAL,
+            poor_quality_customer_ratio REAL,
+            home_broadband_interrupt_duration REAL,
+            home_broadband_weak_light_rate REAL,
+            task_support_timeliness REAL,
+            handover_rate REAL,
+            terminal_inventory REAL,
+            personnel_qualified_rate REAL,
+            low_sales_ratio REAL,
+            business_opportunity_conversion_rate REAL,
+            yuanbao_completion_rate REAL,
+            terminal_revenue REAL,
+            import_date TEXT,
+            total_score REAL,
+            FOREIGN KEY (leader_id) REFERENCES grid_leaders (id)
+        )
+        ''')
+
+        # (姓名, 辖区) 唯一约束由 idx_leaders_name_area 提供；先查找已有的同列唯一索引
+        # （早期建表语句中的 UNIQUE (name, area) 会生成 sqlite_autoindex），避免重复建立同样的索引
+        name_area_indexes = [
+            index_name
+            for _, index_name, unique, *_ in cursor.execute("PRAGMA index_list(grid_leaders)").fetchall()
+            if unique and [col[2] for col in conn.execute(f"PRAGMA index_info({index_name})")] == ["name", "area"]
+        ]
+        if not name_area_indexes:
+            # 兼容旧库：合并重复的网格长（评估记录改指向最早的一条），再补建唯一索引
+            cursor.execute('''
+            UPDATE assessments SET leader_id = (
+                SELECT MIN(g2.id) FROM grid_leaders g1
+                JOIN grid_leaders g2 ON g1.name = g2.name AND g1.area = g2.area
+                WHERE g1.id = assessments.leader_id
+            )
+            WHERE leader_id IN (SELECT id FROM grid_leaders)
+            ''')
+            cursor.execute("DELETE FROM grid_leaders WHERE id NOT IN (SELECT MIN(id) FROM grid_leaders GROUP BY name, area)")
+            cursor.execute("CREATE UNIQUE INDEX idx_leaders_name_area ON grid_leaders (name, area)")
+        elif len(name_area_indexes) > 1 and "idx_leaders_name_area" in name_area_indexes:
+            # 表级 UNIQUE 约束已有自动索引时，去掉重复的命名索引，写入时只维护一份
+            cursor.execute("DROP INDEX idx_leaders_name_area")
+
+        # 创建索引：按网格长查询最新评估、按导入日期清理过期数据
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_assess_leader_date ON assessments (leader_id, date DESC)")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_assess_import_date ON assessments (import_date)")
+
+        # 兼容旧库：补充 total_score 列，并回填历史评估的综合得分（读取时不再现算，空值只在此处补齐）
+        cursor.execute("PRAGMA table_info(assessments)")
+        if "total_score" not in [col[1] for col in cursor.fetchall()]:
+            cursor.execute("ALTER TABLE assessments ADD COLUMN total_score REAL")
+        cursor.execute(
+            f"UPDATE assessments SET total_score = {TOTAL_SCORE_SQL} WHERE total_score IS NULL",
+            WEIGHTS_ARR.tolist()
+        )
+        # 排名查询对窗口函数子查询的结果排序，用不到 total_score 上的索引；删除旧库中的该索引，避免写入时额外维护
+        cursor.execute("DROP INDEX IF EXISTS idx_assess_total_score")
+
     # 初始化数据库
     def init_database():
         print(f"Database path: {db_path}")  # 添加日志输出
@@ -200,89 +414,77 @@ if authentication_status:
             return
         
         try:
-            cursor = conn.cursor()
-            
-            # 创建网格长表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS grid_leaders (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                area TEXT NOT NULL
-            )
-            ''')
-            
-            # 创建评估表
-            cursor.execute('''
-            CREATE TABLE IF NOT EXISTS assessments (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                leader_id INTEGER NOT NULL,
-                date TEXT NOT NULL,
-                professional_skill REAL,
-                index_mastery REAL,
-                management_execution REAL,
-                communication_coordination REAL,
-                marketing_ability REAL,
-                long_work_order_ratio REAL,
-                reminder_rate REAL,
-                on_site_timeliness REAL,
-                repeat_complaint_rate REAL,
-                complaints_per_ten_thousand REAL,
-                contact_service_satisfaction REAL,
-                poor_quality_customer_ratio REAL,
-                home_broadband_interrupt_duration REAL,
-                home_broadband_weak_light_rate REAL,
-                task_support_timeliness REAL,
-                handover_rate REAL,
-                terminal_inventory REAL,
-                personnel_qualified_rate REAL,
-                low_sales_ratio REAL,
-                business_opportunity_conversion_rate REAL,
-                yuanbao_completion_rate REAL,
-                terminal_revenue REAL,
-                import_date TEXT,
-                FOREIGN KEY (leader_id) REFERENCES grid_leaders (id)
-            )
-            ''')
+            with get_db_write_lock(), conn:
+                migrate_database(conn)
+                # 收集表和索引的统计信息，供查询规划器选择合适的索引
+                conn.execute("ANALYZE")
             
-            conn.commit()
             st.success("数据库初始化成功！")
             st.session_state.database_initialized = True
         except Exception as e:
             st.error(f"数据库初始化失败: {e}")
-            conn.rollback()
-        finally:
-            if conn:
-                conn.close()
 
-    def import_data(file):
-        """导入数据时支持列名映射，解决缺少必要列的问题"""
-        if file.name.endswith('.csv'):
-            # 读取文件内容，检查是否为空
-            content = file.read().decode('utf-8', errors='ignore')
-            if not content.strip():
-                st.error("上传的 CSV 文件为空，请检查文件内容。")
-                return False
-            file.seek(0)  # 将文件指针重置到文件开头
+    def get_leaders_by_names(conn, names):
+        """按姓名批量查询网格长，返回 (姓名, 辖区) 到网格长ID的映射"""
+        names = list(dict.fromkeys(names))
+        leader_to_id = {}
+        # 分批拼接 IN 参数，避免超出 SQLite 单条语句的参数个数上限
+        for start in range(0, len(names), 900):
+            batch = names[start:start + 900]
+            placeholders = ", ".join(["?"] * len(batch))
+            cursor = conn.execute(f"SELECT name, area, id FROM grid_leaders WHERE name IN ({placeholders})", batch)
+            leader_to_id.update(((leader_name, leader_area), leader_id) for leader_name, leader_area, leader_id in cursor.fetchall())
+        return leader_to_id
+
+    # 导入 CSV 支持的编码，GB18030 兼容 GBK 与 GB2312
+    CSV_ENCODINGS = ['utf_8', 'gb18030']
+
+    def read_csv_bytes(raw, encoding):
+        """优先使用多线程的 pyarrow 引擎解析 CSV，不可用或解析失败时退回默认的 C 解析器"""
+        if pyarrow is not None:
             try:
-                # 先尝试使用 UTF-8 编码
-                df = pd.read_csv(file, encoding='utf-8', skipinitialspace=True, skip_blank_lines=True)
-            except UnicodeDecodeError:
-                file.seek(0)  # 重置文件指针
+                df = pd.read_csv(BytesIO(raw), encoding=encoding, engine='pyarrow', dtype_backend='pyarrow')
+            except ValueError:
+                pass
+            else:
+                # pyarrow 引擎不支持 skipinitialspace，手动去掉列名和文本列分隔符后的前导空格
+                df.columns = df.columns.str.lstrip()
+                text_cols = df.select_dtypes(include='string').columns
+                df[text_cols] = df[text_cols].apply(lambda col: col.str.lstrip())
+                return df
+        return pd.read_csv(BytesIO(raw), encoding=encoding, skipinitialspace=True, skip_blank_lines=True)
+
+    @st.cache_data(show_spinner=False, max_entries=4)
+    def read_uploaded_file(file_name, raw):
+        """直接从内存中的文件内容解析 DataFrame，按文件名和内容缓存，避免每次重新运行都重新解析"""
+        if file_name.endswith('.csv'):
+            # 检查文件内容是否为空
+            if not raw.decode('utf-8', errors='ignore').strip():
+                raise ValueError("上传的 CSV 文件为空，请检查文件内容。")
+            # 仅用前 64KB 在支持的编码范围内探测一次，避免逐个编码重复解析整个文件；
+            # 限定候选范围可防止短小的中文样本被误判为 cp949 等编码。
+            # 样本截到最后一个换行符，避免从多字节字符中间截断导致探测失败
+            sample = raw[:65536].rsplit(b'\n', 1)[0] if len(raw) > 65536 else raw
+            best_match = charset_normalizer.from_bytes(sample, cp_isolation=CSV_ENCODINGS).best()
+            # 探测失败时才退回逐个尝试
+            encodings = [best_match.encoding] if best_match is not None else CSV_ENCODINGS
+            for encoding in encodings:
                 try:
-                    # 若 UTF-8 失败，尝试 GBK 编码
-                    df = pd.read_csv(file, encoding='gbk', skipinitialspace=True, skip_blank_lines=True)
-                except UnicodeDecodeError:
-                    file.seek(0)  # 重置文件指针
-                    try:
-                        # 若 GBK 失败，尝试 GB2312 编码
-                        df = pd.read_csv(file, encoding='gb2312', skipinitialspace=True, skip_blank_lines=True)
-                    except UnicodeDecodeError:
-                        st.error("无法识别文件编码，请确保文件编码为 UTF-8、GBK 或 GB2312。")
-                        return False
-        elif file.name.endswith(('.xlsx', '.xls')):
-            df = pd.read_excel(file)
-        else:
-            st.error("不支持的文件格式，请上传 xlsx、xls 或 csv 文件。")
+                    return read_csv_bytes(raw, encoding)
+                except (UnicodeDecodeError, LookupError):
+                    continue
+            raise ValueError("无法识别文件编码，请确保文件编码为 UTF-8、GBK 或 GB2312。")
+        elif file_name.endswith(('.xlsx', '.xls')):
+            # 安装了 python-calamine 时使用 Rust 实现的 calamine 引擎，明显快于 openpyxl
+            return pd.read_excel(BytesIO(raw), engine='calamine' if python_calamine is not None else None)
+        raise ValueError("不支持的文件格式，请上传 xlsx、xls 或 csv 文件。")
+
+    def import_data(file):
+        """导入数据时支持列名映射，解决缺少必要列的问题"""
+        try:
+            df = read_uploaded_file(file.name, file.getvalue())
+        except ValueError as e:
+            st.error(str(e))
             return False
         
         # 检查 DataFrame 是否为空
@@ -295,7 +497,7 @@ if authentication_status:
         st.write(df.head())
         
         # 定义必须的列（程序所需的字段）
-        required_fields = ['name', 'area', 'date'] + list(dim_to_db_col.values())
+        required_fields = ['name', 'area', 'date'] + list(DB_COLS_ORDERED)
         
         # 获取文件中的列名
         file_columns = df.columns.tolist()
@@ -316,7 +518,7 @@ if authentication_status:
                 mapped_fields[field] = '无匹配列' if field in ['name', 'area'] else '无匹配列（设为0）'
         
         # 自动映射评估维度列
-        for dim, db_col in dim_to_db_col.items():
+        for dim, db_col in DIM_COLS:
             for col in file_columns:
                 if dim in col:
                     mapped_fields[db_col] = col
@@ -332,7 +534,7 @@ if authentication_status:
         st.write(f"评估日期: {mapped_fields['date']}")
         
         st.write("### 能力评估维度映射")
-        for dim, db_col in dim_to_db_col.items():
+        for dim, db_col in DIM_COLS:
             st.write(f"{dim}: {mapped_fields[db_col]}")
         
         # 确认映射
@@ -344,146 +546,182 @@ if authentication_status:
         
         if st.session_state.confirm_import:
             # 检查基本信息是否有映射
-            if mapped_fields['name'] == '无匹配列' or mapped_fields['area'] == '无匹配列' or mapped_fields['date'] == '无匹配列':
+            if mapped_fields['name'] == '无匹配列' or mapped_fields['area'] == '无匹配列' or mapped_fields['date'] not in file_columns:
                 st.error("姓名、辖区和评估日期必须映射有效列！")
                 st.session_state.confirm_import = False
                 return False
             
+            name_col = mapped_fields['name']
+            area_col = mapped_fields['area']
+            date_col = mapped_fields['date']
+
+            # 导入评估数据，记录导入日期
+            import_date = datetime.now().strftime('%Y/%m/%d')
+
+            # 处理评估维度数据：一次构建按数据库列命名的分数表（使用映射的列，无匹配列设为0），
+            # 不复制整个上传数据，也不逐列插入
+            score_data = pd.DataFrame(
+                {
+                    db_col: df[mapped_fields[db_col]] if mapped_fields[db_col] != '无匹配列（设为0）' else 0
+                    for db_col in DB_COLS_ORDERED
+                },
+                index=df.index
+            )
+
+            # 分数列均为数值类型时（Excel 及 pyarrow 解析的常见情况）直接对整个矩阵比较一次，
+            # 校验通过即可跳过逐列转换；否则再批量定位无效单元格
+            scores_valid = (
+                all(pd.api.types.is_numeric_dtype(dtype) for dtype in score_data.dtypes)
+                and validate_scores_vec(np.ascontiguousarray(score_data.to_numpy(dtype=np.float64, na_value=np.nan)))
+            )
+            if not scores_valid:
+                invalid_scores = validate_scores_df(score_data, list(DB_COLS_ORDERED))
+                if invalid_scores.any():
+                    bad_rows = df.index[invalid_scores.any(axis=1)]
+                    st.error(
+                        f"共 {len(bad_rows)} 条数据的评估分数无效（需为 0~100 之间的数值），"
+                        f"例如第 {'、'.join(str(row + 1) for row in bad_rows[:10])} 条，请检查后重新导入。"
+                    )
+                    st.session_state.confirm_import = False
+                    return False
+
+            # 向量化解析日期，替代逐行 strptime；允许同一列中混用日期和日期时间格式
+            parsed_dates = pd.to_datetime(
+                df[date_col].astype(str).str.strip(), errors='coerce', format='mixed'
+            )
+            if parsed_dates.isna().any():
+                bad_row = df.index[parsed_dates.isna()][0]
+                st.error(
+                    f"第 {bad_row + 1} 条数据日期格式错误: {df.at[bad_row, date_col]}，"
+                    "请使用 'YYYY-MM-DD' 或 'YYYY-MM-DD HH:MM:SS' 格式。"
+                )
+                st.session_state.confirm_import = False
+                return False
+            date_values = parsed_dates.dt.strftime('%Y/%m/%d')
+
+            # 姓名和辖区统一规范为去除首尾空白的文本，写入和按 (姓名, 辖区) 查询使用同一份值；
+            # 否则纯数字的辖区写入后被存为 TEXT，查询时却仍是数值，导致匹配不到网格长
+            leader_names = df[name_col].astype(str).str.strip()
+            leader_areas = df[area_col].astype(str).str.strip()
+            # 空值须在转为文本之前判断，否则会变成字符串 'nan' 被当作网格长姓名导入
+            missing_leader = (
+                df[[name_col, area_col]].isna().any(axis=1).to_numpy()
+                | (leader_names == '').to_numpy()
+                | (leader_areas == '').to_numpy()
+            )
+            if missing_leader.any():
+                bad_row = df.index[missing_leader][0]
+                st.error(f"第 {bad_row + 1} 条数据的姓名或辖区为空，请补充后重新导入。")
+                st.session_state.confirm_import = False
+                return False
+            leader_names = leader_names.tolist()
+            leader_areas = leader_areas.tolist()
+
             # 准备导入数据
             conn = get_db_connection()
             if conn is None:
                 st.session_state.confirm_import = False
                 return False
-            
-            try:
-                with conn:  # 使用上下文管理器自动管理事务
-                    cursor = conn.cursor()
-                    # 导入网格长数据（去重处理）
-                    leaders_data = df.drop_duplicates(subset=[mapped_fields['name'], mapped_fields['area']])
-                    for _, row in leaders_data.iterrows():
-                        leader_name = row[mapped_fields['name']]
-                        leader_area = row[mapped_fields['area']]
-                        cursor.execute("INSERT OR IGNORE INTO grid_leaders (name, area) VALUES (?, ?)", (leader_name, leader_area))
-                
-                    # 导入评估数据，记录导入日期
-                    import_date = datetime.now().strftime('%Y/%m/%d')
-                    assessment_data = df.copy()
-                    
-                    # 处理评估维度数据
-                    for db_col in dim_to_db_col.values():
-                        file_col = mapped_fields[db_col]
-                        if file_col != '无匹配列（设为0）':
-                            # 使用映射的列
-                            assessment_data[db_col] = assessment_data[file_col]
-                        else:
-                            # 无匹配列，设为0
-                            assessment_data[db_col] = 0
-                    
-                    # 批量导入评估数据
-                    for _, row in assessment_data.iterrows():
-                        # 查找网格长ID
-                        leader_name = row[mapped_fields['name']]
-                        cursor.execute("SELECT id FROM grid_leaders WHERE name = ?", (leader_name,))
-                        leader = cursor.fetchone()
-                        if leader:
-                            leader_id = leader[0]
-                            # 处理日期格式
-                            try:
-                                # 尝试解析多种可能的日期格式
-                                date_str = str(row[mapped_fields['date']])
-                                if ' ' in date_str:
-                                    date_obj = datetime.strptime(date_str, '%Y-%m-%d %H:%M:%S')
-                                else:
-                                    date_obj = datetime.strptime(date_str, '%Y-%m-%d')
-                                date_value = date_obj.strftime('%Y/%m/%d')
-                            except ValueError:
-                                st.error(f"日期格式错误: {row[mapped_fields['date']]}，请使用 'YYYY-MM-DD' 或 'YYYY-MM-DD HH:MM:SS' 格式。")
-                                st.session_state.confirm_import = False
-                                return False
-                            
-                            values = [
-                                leader_id, date_value
-                            ] + [row[db_col] for db_col in dim_to_db_col.values()] + [import_date]
-                            
-                            columns = "leader_id, date, " + ", ".join(dim_to_db_col.values()) + ", import_date"
-                            placeholders = ", ".join(["?"] * (len(dim_to_db_col) + 3))
-                            cursor.execute(f"INSERT INTO assessments ({columns}) VALUES ({placeholders})", values)
-                    
-                    # 强制刷新网格长列表缓存
-                    get_all_leaders(refresh=True)
-                    st.success(f"成功导入 {len(leaders_data)} 条网格长数据和 {len(assessment_data)} 条评估数据")
+
+            with get_db_write_lock():
+                try:
+                    # 批量导入期间关闭同步写盘，事务结束后恢复
+                    conn.execute("PRAGMA synchronous=OFF")
+                    with conn:  # 使用上下文管理器自动管理事务
+                        # 显式开启写事务，整个导入只提交一次
+                        conn.execute("BEGIN IMMEDIATE")
+                        cursor = conn.cursor()
+                        # 导入网格长数据，一次 executemany 批量写入，由 (name, area) 唯一索引去重
+                        cursor.executemany(
+                            "INSERT INTO grid_leaders (name, area) VALUES (?, ?) ON CONFLICT (name, area) DO NOTHING",
+                            zip(leader_names, leader_areas)
+                        )
+                        inserted_leaders = cursor.rowcount
+
+                        # 只查询本次导入涉及的姓名，构建 (姓名, 辖区) 到网格长ID的映射，避免逐行查询；
+                        # 与 UNIQUE (name, area) 约束一致，同名不同辖区的网格长不会混淆
+                        leader_to_id = get_leaders_by_names(conn, leader_names)
+                        leader_ids = pd.Series(
+                            [leader_to_id.get(key) for key in zip(leader_names, leader_areas)],
+                            index=df.index,
+                            dtype=object
+                        )
+                        unresolved = leader_ids.isna().to_numpy()
+                        if unresolved.any():
+                            # 抛出异常使整个导入事务回滚，不静默丢弃评估数据
+                            pos = int(np.flatnonzero(unresolved)[0])
+                            raise ValueError(
+                                f"共 {int(unresolved.sum())} 条数据未能匹配到网格长，例如第 {df.index[pos] + 1} 条"
+                                f"（姓名: {leader_names[pos]}，辖区: {leader_areas[pos]}）"
+                            )
+
+                        # 按列组装评估数据（列顺序与 INSERT 语句一致），缺失分数按0处理
+                        out = score_data.fillna(0).astype(float)
+                        out.insert(0, 'date', date_values)
+                        out.insert(0, 'leader_id', leader_ids)
+                        out['import_date'] = import_date
+                        out['total_score'] = compute_total_scores(score_matrix(out))
+                        out = out.astype({'leader_id': int})
+
+                        columns = "leader_id, date, " + ", ".join(DB_COLS_ORDERED) + ", import_date, total_score"
+                        placeholders = ", ".join(["?"] * (len(DB_COLS_ORDERED) + 4))
+                        cursor.executemany(
+                            f"INSERT INTO assessments ({columns}) VALUES ({placeholders})",
+                            out.itertuples(index=False, name=None)
+                        )
+
+                        # 数据已变化，使查询缓存失效
+                        bump_data_version()
+                        st.success(f"成功导入 {inserted_leaders} 条网格长数据和 {len(out)} 条评估数据")
+                        st.session_state.confirm_import = False
+                        return True
+                except Exception as e:
+                    st.error(f"数据导入失败: {str(e)}")
                     st.session_state.confirm_import = False
-                    return True
-            except Exception as e:
-                st.error(f"数据导入失败: {str(e)}")
-                st.session_state.confirm_import = False
-                return False
-            finally:
-                if conn:
-                    conn.close()
+                    return False
+                finally:
+                    conn.execute("PRAGMA synchronous=NORMAL")
+
+    @st.cache_data(ttl=60, show_spinner=False, max_entries=4)
+    def query_export_data(leader_id, db_version):
+        """查询导出用的评估数据（中文列名），结果按网格长和数据库版本缓存"""
+        select_columns = ", ".join(
+            ["a.id", "a.leader_id", "a.date"] + [f"a.{col}" for col in db_columns]
+            + ["a.import_date", "a.total_score", "g.name", "g.area"]
+        )
+        sql = f"SELECT {select_columns} FROM assessments a LEFT JOIN grid_leaders g ON a.leader_id = g.id"
+        params = ()
+        if leader_id is not None:
+            sql += " WHERE a.leader_id = ?"
+            params = (leader_id,)
+        sql += " ORDER BY a.date DESC"
+        # 分块读取，由 pandas 直接构建列数据，不经过逐行字典
+        df = read_sql_df(sql, params=params, chunksize=10000)
+
+        # 定义英文列名到中文列名的映射
+        column_mapping = {
+            "id": "评估记录ID",
+            "leader_id": "网格长ID",
+            "date": "评估日期",
+            **{db_col: dim for dim, db_col in DIM_COLS},
+            "import_date": "导入日期",
+            "total_score": "综合得分",
+            "name": "网格长姓名",
+            "area": "辖区"
+        }
+
+        # 将英文列名转换为中文列名
+        return df.rename(columns=column_mapping)
 
     def export_assessment_data(leader_id=None):
         """导出评估数据为 DataFrame，支持指定网格长或全部"""
-        conn = get_db_connection()
-        if conn is None:
+        if get_db_connection() is None:
             return pd.DataFrame()
         try:
-            cursor = conn.cursor()
-            if leader_id is not None:
-                cursor.execute(
-                    "SELECT a.*, g.name, g.area FROM assessments a LEFT JOIN grid_leaders g ON a.leader_id = g.id WHERE a.leader_id = ? ORDER BY a.date DESC",
-                    (leader_id,)
-                )
-            else:
-                cursor.execute(
-                    "SELECT a.*, g.name, g.area FROM assessments a LEFT JOIN grid_leaders g ON a.leader_id = g.id ORDER BY a.date DESC"
-                )
-            rows = cursor.fetchall()
-            columns = [desc[0] for desc in cursor.description]
-
-            # 定义英文列名到中文列名的映射
-            column_mapping = {
-                "id": "评估记录ID",
-                "leader_id": "网格长ID",
-                "date": "评估日期",
-                "professional_skill": "专业技术能力",
-                "index_mastery": "指标掌控能力",
-                "management_execution": "管理执行能力",
-                "communication_coordination": "沟通协调能力",
-                "marketing_ability": "市场营销能力",
-                "long_work_order_ratio": "超长工单占比",
-                "reminder_rate": "催单率",
-                "on_site_timeliness": "上门及时率",
-                "repeat_complaint_rate": "重复投诉率",
-                "complaints_per_ten_thousand": "万投比",
-                "contact_service_satisfaction": "触点服务客户满意占比",
-                "poor_quality_customer_ratio": "质差客户占比",
-                "home_broadband_interrupt_duration": "家宽单用户中断时长",
-                "home_broadband_weak_light_rate": "家宽弱光率",
-                "task_support_timeliness": "任务工单支撑及时率",
-                "handover_rate": "交班交底率",
-                "terminal_inventory": "终端盘点",
-                "personnel_qualified_rate": "人员达标率",
-                "low_sales_ratio": "低销占比",
-                "business_opportunity_conversion_rate": "商机转化率",
-                "yuanbao_completion_rate": "元宝完成率",
-                "terminal_revenue": "终端收入",
-                "import_date": "导入日期",
-                "name": "网格长姓名",
-                "area": "辖区"
-            }
-
-            # 将英文列名转换为中文列名
-            chinese_columns = [column_mapping.get(col, col) for col in columns]
-
-            df = pd.DataFrame(rows, columns=chinese_columns)
-            return df
+            return query_export_data(leader_id, get_db_version())
         except Exception as e:
             st.error(f"导出数据失败: {e}")
             return pd.DataFrame()
-        finally:
-            if conn:
-                conn.close()
 
     def clear_expired_data(days=30):
         """清理超过指定天数的评估数据"""
@@ -492,24 +730,46 @@ if authentication_status:
             return False
         
         try:
-            cursor = conn.cursor()
-            expired_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
-            cursor.execute("DELETE FROM assessments WHERE import_date < ?", (expired_date,))
-            conn.commit()
+            with get_db_write_lock(), conn:
+                cursor = conn.cursor()
+                expired_date = (datetime.now() - timedelta(days=days)).strftime('%Y/%m/%d')
+                cursor.execute("DELETE FROM assessments WHERE import_date < ?", (expired_date,))
+            bump_data_version()
             return True
         except Exception as e:
             st.error(f"清理过期数据失败: {e}")
-            conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
+
+    # 导出 CSV 超过该大小（按 DataFrame 内存占用估算）时使用 gzip 压缩
+    CSV_GZIP_THRESHOLD = 20 * 1024 * 1024
+
+    def to_csv(df):
+        """将 DataFrame 导出为 CSV 文件的二进制流，数据量较大时返回 gzip 压缩结果"""
+        compress = int(df.memory_usage(deep=True).sum()) > CSV_GZIP_THRESHOLD
+        output = BytesIO()
+        # 直接按块写入二进制缓冲区，不经过完整的 Python 字符串中间结果
+        df.to_csv(
+            output, sep='\t', na_rep='nan', encoding='utf-8', chunksize=10000,
+            compression='gzip' if compress else None
+        )
+        return output.getvalue(), compress
+
+    @st.cache_data(ttl=60, show_spinner=False, max_entries=4)
+    def export_csv(leader_id, db_version):
+        """生成导出的 CSV 数据，按网格长和数据库版本缓存，数据未变化时重复导出不再重新编码"""
+        return to_csv(query_export_data(leader_id, db_version))
 
     def to_excel(df):
         """将 DataFrame 导出为 Excel 文件的二进制流"""
         output = BytesIO()
-        with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-            df.to_excel(writer, index=False)
+        # constant_memory 模式要求按行顺序写入，因此逐行写出而不经过 pandas 的按列写入
+        workbook = xlsxwriter.Workbook(output, {'constant_memory': True})
+        worksheet = workbook.add_worksheet()
+        worksheet.write_row(0, 0, df.columns.tolist())
+        values = df.astype(object).where(df.notna(), None)
+        for row_idx, row in enumerate(values.itertuples(index=False, name=None), start=1):
+            worksheet.write_row(row_idx, 0, row)
+        workbook.close()
         output.seek(0)
         return output.getvalue()
 
@@ -519,30 +779,34 @@ if authentication_status:
         if conn is None:
             return False
         try:
-            cursor = conn.cursor()
-            cursor.execute("DELETE FROM assessments")
-            cursor.execute("DELETE FROM grid_leaders")
-            conn.commit()
-            # 清空缓存
-            if 'all_leaders' in st.session_state:
-                del st.session_state.all_leaders
+            with get_db_write_lock(), conn:
+                cursor = conn.cursor()
+                cursor.execute("DELETE FROM assessments")
+                cursor.execute("DELETE FROM grid_leaders")
+            # 使查询缓存失效
+            bump_data_version()
             st.success("所有数据已成功清空！")
             return True
         except Exception as e:
             st.error(f"清空数据失败: {e}")
-            conn.rollback()
             return False
-        finally:
-            if conn:
-                conn.close()
 
     def backup_database():
         """备份数据库"""
         backup_dir = "backups"
         os.makedirs(backup_dir, exist_ok=True)
         backup_file = os.path.join(backup_dir, f"grid_assessment_{datetime.now().strftime('%Y%m%d%H%M%S')}.db")
+        conn = get_db_connection()
+        if conn is None:
+            return False
         try:
-            shutil.copy2(db_path, backup_file)
+            # 使用 SQLite 在线备份接口（包含 WAL 中已提交的数据），持有写锁保证备份期间没有进行中的写事务
+            with get_db_write_lock():
+                target = sqlite3.connect(backup_file)
+                try:
+                    conn.backup(target)
+                finally:
+                    target.close()
             st.info(f"数据库备份成功，备份文件路径: {backup_file}")
             return True
         except Exception as e:
@@ -557,10 +821,6 @@ if authentication_status:
     )
     st.title("网格长能力评估系统")
     
-    # 初始化会话状态
-    if 'all_leaders' not in st.session_state:
-        st.session_state.all_leaders = get_all_leaders()
-    
     # 侧边栏
     with st.sidebar:
         # 手动初始化数据库按钮
@@ -569,8 +829,6 @@ if authentication_status:
             # 初始化成功后检查并清理过期数据
             if st.session_state.get('database_initialized', False):
                 clear_expired_data()
-            # 刷新网格长列表
-            st.session_state.all_leaders = get_all_leaders(refresh=True)
         
         st.header("选择评估周期")
         selected_date = st.selectbox(
@@ -579,7 +837,7 @@ if authentication_status:
         )
         
         st.header("选择网格长")
-        all_leaders = st.session_state.all_leaders
+        all_leaders = get_all_leaders()
         leader_names = [leader["name"] for leader in all_leaders]
         
         # 处理无网格长数据的情况
@@ -588,27 +846,34 @@ if authentication_status:
             conn = get_db_connection()
             if conn:
                 try:
-                    cursor = conn.cursor()
-                    # 添加示例网格长
-                    cursor.execute("INSERT OR IGNORE INTO grid_leaders (name, area) VALUES (?, ?)", ("示例网格长", "示例区域"))
-                    conn.commit()
-                    # 刷新缓存
-                    st.session_state.all_leaders = get_all_leaders(refresh=True)
-                    all_leaders = st.session_state.all_leaders
+                    with get_db_write_lock(), conn:
+                        cursor = conn.cursor()
+                        # 添加示例网格长：在写事务内用 EXISTS 再确认一次表为空（找到一行即停止），
+                        # 避免缓存的网格长列表过期时向已有数据的库中插入示例数据
+                        cursor.execute(
+                            "INSERT INTO grid_leaders (name, area) "
+                            "SELECT ?, ? WHERE NOT EXISTS (SELECT 1 FROM grid_leaders)",
+                            ("示例网格长", "示例区域")
+                        )
+                    # 使查询缓存失效
+                    bump_data_version()
+                    all_leaders = get_all_leaders()
                     leader_names = [leader["name"] for leader in all_leaders]
                 except Exception as e:
                     st.error(f"添加示例数据失败: {e}")
-                finally:
-                    conn.close()
+        
+        # 按姓名建立索引，后续查找无需线性扫描（同名时与原逻辑一致取第一条）
+        leader_by_name = {leader["name"]: leader for leader in reversed(all_leaders)}
+        name_to_index = {leader_name: i for i, leader_name in reversed(list(enumerate(leader_names)))}
         
         # 确保下拉菜单使用最新的 leader_names，并处理选择逻辑
-        if 'selected_name' not in st.session_state or st.session_state.selected_name not in leader_names:
+        if 'selected_name' not in st.session_state or st.session_state.selected_name not in name_to_index:
             st.session_state.selected_name = leader_names[0] if leader_names else None
         
         selected_name = st.selectbox(
             "选择网格长姓名",
             leader_names,
-            index=leader_names.index(st.session_state.selected_name) if st.session_state.selected_name in leader_names else 0,
+            index=name_to_index.get(st.session_state.selected_name, 0),
             key="leader_selectbox"
         )
         st.session_state.selected_name = selected_name
@@ -630,7 +895,7 @@ if authentication_status:
         export_scope = st.selectbox("选择导出范围", ["指定网格长", "所有网格长"])
         
         if export_scope == "指定网格长":
-            selected_leader = next((leader for leader in all_leaders if leader["name"] == st.session_state.selected_name), None)
+            selected_leader = leader_by_name.get(st.session_state.selected_name)
             if selected_leader:
                 leader_id = selected_leader["id"]
             else:
@@ -643,12 +908,12 @@ if authentication_status:
             df = export_assessment_data(leader_id)
             if df is not None and not df.empty:
                 if export_format == "CSV":
-                    csv = df.to_csv(sep='\t', na_rep='nan')
+                    csv, compressed = export_csv(leader_id, get_db_version())
                     st.download_button(
                         label="下载 CSV 文件",
                         data=csv,
-                        file_name="assessment_data.csv",
-                        mime="text/csv"
+                        file_name="assessment_data.csv.gz" if compressed else "assessment_data.csv",
+                        mime="application/gzip" if compressed else "text/csv"
                     )
                 elif export_format == "Excel":
                     excel_file = to_excel(df)
@@ -677,7 +942,6 @@ if authentication_status:
             if clear_data():
                 st.success("所有数据已成功清空！")
                 # 清空会话状态
-                st.session_state.all_leaders = get_all_leaders()
                 if 'selected_name' in st.session_state:
                     del st.session_state.selected_name
             else:
@@ -687,120 +951,118 @@ if authentication_status:
         if st.button("备份数据库", key="backup_db_button"):
             backup_database()
     
-    def get_all_leaders_assessments():
-        """获取所有网格长的最新评估数据"""
-        conn = get_db_connection()
-        if conn is None:
-            return []
+    @st.cache_data(ttl=60, show_spinner=False)
+    def query_latest_scores_df(db_version):
+        """查询所有网格长的最新评估数据，结果按数据库版本缓存"""
+        # 使用窗口函数取每个网格长的最新一条评估，走 (leader_id, date) 索引；
+        # 综合得分已由写入和 migrate_database 回填，直接读入 DataFrame，不经过逐行字典
+        return read_sql_df("""
+            SELECT a.leader_id, a.date, a.total_score, g.name, g.area
+            FROM (
+                SELECT leader_id, date, total_score, ROW_NUMBER() OVER (
+                    PARTITION BY leader_id ORDER BY date DESC, id DESC
+                ) AS rn
+                FROM assessments
+            ) a
+            JOIN grid_leaders g ON a.leader_id = g.id
+            WHERE a.rn = 1
+            ORDER BY a.total_score DESC
+        """)
+
+    @st.cache_data(ttl=60, show_spinner=False)
+    def query_ranking_df(db_version):
+        """计算全量网格长排名表，结果按数据库版本缓存，切换网格长或日期时直接复用"""
+        # 综合得分已在写入时持久化，排名和等级在数组上一次性计算
+        latest_scores = query_latest_scores_df(db_version)
+        rank_totals = np.round(
+            latest_scores["total_score"].fillna(0).to_numpy(dtype=np.float64), TOTAL_SCORE_DECIMALS
+        )
+        ranks, grade_codes = get_rank_kernel()(rank_totals, GRADE_BOUNDS)
+        return pd.DataFrame({
+            "姓名": latest_scores["name"].to_numpy(),
+            "辖区": latest_scores["area"].to_numpy(),
+            "综合得分": rank_totals,
+            "评估等级": GRADE_LABELS[grade_codes],
+            "排名": ranks
+        }).sort_values("排名", ignore_index=True)
+
+    def get_ranking_df():
+        """获取全量网格长排名表（DataFrame）"""
+        empty = pd.DataFrame(columns=["姓名", "辖区", "综合得分", "评估等级", "排名"])
+        if get_db_connection() is None:
+            return empty
         
         try:
-            cursor = conn.cursor()
-            cursor.execute("""
-                SELECT a.*, g.name, g.area 
-                FROM assessments a
-                JOIN grid_leaders g ON a.leader_id = g.id
-                WHERE (a.leader_id, a.date) IN (
-                    SELECT leader_id, MAX(date) 
-                    FROM assessments 
-                    GROUP BY leader_id
-                )
-            """)
-            columns = [col[0] for col in cursor.description]
-            return [dict(zip(columns, row)) for row in cursor.fetchall()]
+            return query_ranking_df(get_db_version())
         except Exception as e:
             st.error(f"获取所有网格长评估数据失败: {e}")
-            return []
-        finally:
-            if conn:
-                conn.close()
+            return empty
     
     # 主界面内容
 if 'selected_name' in st.session_state and st.session_state.selected_name:
-    selected_leader = next((leader for leader in all_leaders if leader["name"] == st.session_state.selected_name), None)
+    selected_leader = leader_by_name.get(st.session_state.selected_name)
     if selected_leader:
         leader_id = selected_leader["id"]
         assessments = get_leader_assessments(leader_id)
 
-        if assessments:
+        if not assessments.empty:
             # 找到对应日期的评估记录，若无则使用最新记录
-            selected_assessment = next(
-                (a for a in assessments if a["date"] == selected_date),
-                assessments[0]
-            )
+            matched = assessments.index[assessments["date"] == selected_date]
+            selected_assessment = assessments.loc[matched[0] if len(matched) else assessments.index[0]]
 
             st.subheader(f"网格长: {selected_leader['name']} - {selected_leader['area']}")
             st.subheader(f"评估日期: {selected_assessment['date']}")
 
+            # 按 DIMENSIONS 顺序一次性取出各维度分数，空值按0处理
+            score_values = selected_assessment[list(DB_COLS_ORDERED)].fillna(0).to_numpy(dtype=np.float64)
+
             # 显示评估分数
             st.subheader("能力评估分数")
             col1, col2 = st.columns(2)
-            for i, dim in enumerate(DIMENSIONS):
+            for i, (dim, score) in enumerate(zip(DIMENSIONS, score_values)):
                 col = col1 if i < len(DIMENSIONS)/2 else col2
                 with col:
-                    score = selected_assessment.get(dim_to_db_col[dim], 0)
                     st.metric(dim, f"{score:.2f}分")
 
-            # 计算综合得分
-            scores = {dim: selected_assessment.get(dim_to_db_col[dim], 0) for dim in DIMENSIONS}
-            total_score = calculate_total_score(scores, WEIGHTS, DIMENSIONS)
+            # 使用持久化的综合得分，与排名表的得分和等级保持一致（按相同精度舍入）
+            total_score = round(float(selected_assessment["total_score"]), TOTAL_SCORE_DECIMALS)
 
             st.subheader(f"综合得分: {total_score:.2f}分")
 
             # 显示评估等级
-            grade = "优秀" if total_score >= THRESHOLDS["优秀"] else \
-                    "良好" if total_score >= THRESHOLDS["良好"] else \
-                    "合格" if total_score >= THRESHOLDS["合格"] else "待改进"
+            grade = GRADE_LABELS[bucketize(total_score)]
             st.subheader(f"评估等级: {grade}")
 
-            # 显示全量网格分值排名对比
-            all_assessments = get_all_leaders_assessments()
-            all_scores = []
-            for assessment in all_assessments:
-                scores = {dim: assessment.get(dim_to_db_col[dim], 0) for dim in DIMENSIONS}
-                total_score = calculate_total_score(scores, WEIGHTS, DIMENSIONS)
-                all_scores.append({
-                    "姓名": assessment['name'],
-                    "辖区": assessment['area'],
-                    "综合得分": total_score,
-                    "评估等级": "优秀" if total_score >= THRESHOLDS["优秀"] else
-                              "良好" if total_score >= THRESHOLDS["良好"] else
-                              "合格" if total_score >= THRESHOLDS["合格"] else "待改进"
-                })
-
-            # 按综合得分排序
-            all_scores.sort(key=lambda x: x["综合得分"], reverse=True)
-            # 添加排名列
-            for i, score_info in enumerate(all_scores, start=1):
-                score_info["排名"] = i
-
+            # 显示全量网格分值排名对比（排名表按数据版本缓存，每次重新运行只计算高亮行）
             st.subheader("全量网格分值排名对比")
-            df = pd.DataFrame(all_scores)
-            # 高亮显示选中的网格长
-            def highlight_selected(s):
-                if s["姓名"] == selected_leader["name"]:
-                    return ['background-color: yellow'] * len(s)
-                return [''] * len(s)
-            st.dataframe(df.style.apply(highlight_selected, axis=1))
+            df = get_ranking_df()
+            # 高亮显示选中的网格长：预先计算行掩码，按列整体应用样式
+            selected_mask = (df["姓名"] == selected_leader["name"]).to_numpy()
+            st.dataframe(df.style.apply(lambda col: np.where(selected_mask, 'background-color: yellow', ''), axis=0))
 
             # 显示网格具体得分结果
             st.subheader("网格具体得分结果")
             st.write(pd.DataFrame({
                 "维度": DIMENSIONS,
-                "得分": [selected_assessment.get(dim_to_db_col[dim], 0) for dim in DIMENSIONS]
+                "得分": score_values
             }))
 
             # 添加低分值原因和提升建议
             low_score_threshold = 60  # 低分值阈值
-            low_score_dimensions = [dim for dim in DIMENSIONS if scores[dim] < low_score_threshold]
+            # 在分数向量上一次比较得到低分维度下标（保持 DIMENSIONS 顺序），不逐维度查字典
+            low_score_idx = np.flatnonzero(score_values < low_score_threshold)
 
-            if low_score_dimensions:
+            if low_score_idx.size:
                 st.subheader("低分值原因及提升建议")
-                for dim in low_score_dimensions:
-                    st.write(f"### {dim}（得分: {scores[dim]:.2f}分）")
-                    st.write("**低分值原因**：该维度得分较低，可能在相关业务能力上存在不足。")
-                    st.write("**提升建议**：")
-                    for tip in IMPROVEMENT_TIPS[dim]:
-                        st.write(f"- {tip}")
+                # 每个维度拼成一段 Markdown 文本一次输出，避免逐行调用 st.write 各生成一个页面元素
+                for i in low_score_idx:
+                    dim = DIMENSIONS[i]
+                    st.markdown("\n\n".join([
+                        f"### {dim}（得分: {score_values[i]:.2f}分）",
+                        "**低分值原因**：该维度得分较低，可能在相关业务能力上存在不足。",
+                        "**提升建议**：",
+                        "\n".join(f"- {tip}" for tip in IMPROVEMENT_TIPS[dim])
+                    ]))
             else:
                 st.success("所有维度得分均高于阈值，表现优秀！")
         else:
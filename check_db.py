@@ -1,22 +1,29 @@
 import sqlite3
 
-# 数据库文件路径
+# 数据库文件路径（与 app.py 使用的数据库一致）
 db_path = "data/grid_assessment.db"
 
-# 连接数据库
-conn = sqlite3.connect(db_path)
-cursor = conn.cursor()
+if __name__ == '__main__':
+    # 连接数据库
+    conn = sqlite3.connect(db_path)
+    cursor = conn.cursor()
 
-# 查询 assessments 表的数据
-cursor.execute("SELECT * FROM assessments")
-rows = cursor.fetchall()
+    try:
+        # 查询 assessments 表的数据，分批读取，避免一次性把整张表载入内存
+        cursor.execute("SELECT * FROM assessments")
+        has_rows = False
+        while True:
+            rows = cursor.fetchmany(1000)
+            if not rows:
+                break
+            if not has_rows:
+                print("assessments 表中有数据：")
+                has_rows = True
+            for row in rows:
+                print(row)
 
-if rows:
-    print("assessments 表中有数据：")
-    for row in rows:
-        print(row)
-else:
-    print("assessments 表中没有数据。")
-
-# 关闭连接
-conn.close()
+        if not has_rows:
+            print("assessments 表中没有数据。")
+    finally:
+        # 关闭连接
+        conn.close()